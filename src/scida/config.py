@@ -2,14 +2,33 @@
 Configuration handling.
 """
 
+import copy
+import functools
 import importlib.resources
+import json
+import logging
 import os
 import pathlib
-from typing import Dict, List, Optional
+import tempfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 import yaml
 
-_conf = dict()
+from scida.helpers_misc import hash_path
+
+log = logging.getLogger(__name__)
+
+_conf: Optional[Dict] = None  # loaded lazily on first call of get_config()
+
+# use the libyaml bindings where available
+_YAMLLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# cache of parsed config files: absolute path -> (mtime, size, config)
+_configfile_cache: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+_configfile_cache_maxsize = 100
+
+_MISSING = object()  # sentinel for missing dict entries
 
 
 def _access_confdir() -> str:
@@ -25,7 +44,9 @@ def _access_confdir() -> str:
     path_user = os.path.expanduser("~")
     path_confdir = os.path.join(path_user, ".config/scida")
     path_conf = os.path.join(path_confdir, "config.yaml")
-    if not os.path.exists(path_conf):
+    try:
+        os.stat(path_conf)
+    except FileNotFoundError:
         copy_defaultconfig(overwrite=False)
     return path_confdir
 
@@ -47,6 +68,8 @@ def get_config(reload: bool = False, update_global=True) -> dict:
         The configuration dictionary.
     """
     global _conf
+    if not reload and _conf is not None:
+        return _conf
     prefix = "SCIDA_"
     envconf = {
         k.replace(prefix, "").lower(): v
@@ -62,8 +85,6 @@ def get_config(reload: bool = False, update_global=True) -> dict:
     path = envconf.pop("config_path", None)
     if path is None:
         path = path_conf
-    if not reload and len(_conf) > 0:
-        return _conf
     config = get_config_fromfile(path)
     if config.get("copied_default", False):
         print(
@@ -215,26 +236,154 @@ def get_config_fromfile(resource: str) -> Dict:
     # 1. absolute path?
     path = os.path.expanduser(resource)
     if os.path.isabs(path):
-        with open(path, "r") as file:
-            conf = yaml.safe_load(file)
-        return conf
+        return _load_yaml_cached(path)
     # 2. non-absolute path?
     # 2.1. check ~/.config/scida/
     bpath = os.path.expanduser("~/.config/scida")
     path = os.path.join(bpath, resource)
     if os.path.isfile(path):
-        with open(path, "r") as file:
-            conf = yaml.safe_load(file)
-        return conf
+        return _load_yaml_cached(path)
     # 2.2 check scida package resources
     resource_path = "scida.configfiles"
     resource_elements = resource.split("/")
     rname = resource_elements[-1]
     if len(resource_elements) > 1:
         resource_path += "." + ".".join(resource_elements[:-1])
-    with importlib.resources.path(resource_path, rname) as fp:
-        with open(fp, "r") as file:
-            conf = yaml.safe_load(file)
+    return _load_yaml_cached(_resolve_package_resource(resource_path, rname))
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_package_resource(resource_path: str, rname: str) -> str:
+    """
+    Resolve a package resource to a file path.
+    For packages not located on the file system (e.g. zipped), the resource is
+    extracted to a temporary file once.
+
+    Parameters
+    ----------
+    resource_path: str
+        The package containing the resource.
+    rname: str
+        The name of the resource.
+
+    Returns
+    -------
+    str
+        Path to the resource.
+    """
+    fp = importlib.resources.files(resource_path) / rname
+    if isinstance(fp, pathlib.Path):
+        return str(fp)
+    suffix = "_" + rname
+    with tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as file:
+        file.write(fp.read_bytes())
+    return file.name
+
+
+def _load_yaml_cached(path: str) -> Dict:
+    """
+    Load a YAML file, reusing the parsed result if the file did not change.
+    Changes are detected via the file's modification time and size.
+
+    Parameters
+    ----------
+    path: str
+        Path to the YAML file.
+
+    Returns
+    -------
+    dict
+        A copy of the parsed YAML file.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    entry = _configfile_cache.get(path)
+    if entry is not None and entry[0] == st.st_mtime and entry[1] == st.st_size:
+        _configfile_cache.move_to_end(path)
+        conf = entry[2]
+    else:
+        conf = _load_yaml_sidecar(path, st)
+        _configfile_cache[path] = (st.st_mtime, st.st_size, conf)
+        _configfile_cache.move_to_end(path)
+        if len(_configfile_cache) > _configfile_cache_maxsize:
+            _configfile_cache.popitem(last=False)
+    # callers modify the returned configs in place, so hand out a copy
+    return copy.deepcopy(conf)
+
+
+def _get_sidecar_path(path: str) -> Optional[str]:
+    """
+    Get the path of the JSON sidecar file caching the parsed content of a YAML file.
+
+    Parameters
+    ----------
+    path: str
+        Absolute path to the YAML file.
+
+    Returns
+    -------
+    Optional[str]
+        Path to the sidecar file, None if no cache directory is configured (yet).
+    """
+    if _conf is None or "cache_path" not in _conf:
+        return None
+    cachedir = os.path.expanduser(_conf["cache_path"])
+    return os.path.join(cachedir, "configs", hash_path(path) + ".json")
+
+
+def _load_yaml_sidecar(path: str, st: os.stat_result) -> Dict:
+    """
+    Load a YAML file, using a JSON sidecar file in the cache directory if it is up-to-date.
+    Otherwise, parse the YAML file and (re-)create the sidecar file.
+
+    Parameters
+    ----------
+    path: str
+        Absolute path to the YAML file.
+    st: os.stat_result
+        Result of os.stat() for the YAML file.
+
+    Returns
+    -------
+    dict
+        The parsed YAML file.
+    """
+    sidecar = _get_sidecar_path(path)
+    if sidecar is not None:
+        try:
+            with open(sidecar, "r") as file:
+                cached = json.load(file)
+            if cached["mtime_ns"] == st.st_mtime_ns and cached["size"] == st.st_size:
+                return cached["config"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # no (valid) sidecar file
+
+    with open(path, "r") as file:
+        conf = yaml.load(file, Loader=_YAMLLoader)
+    if sidecar is None:
+        return conf
+
+    # only write configs that survive the JSON round trip unchanged
+    # (e.g. YAML allows non-string keys and dates)
+    try:
+        content = json.dumps(
+            dict(mtime_ns=st.st_mtime_ns, size=st.st_size, config=conf)
+        )
+        if json.loads(content)["config"] != conf:
+            return conf
+    except (TypeError, ValueError):
+        return conf
+    tmppath = None
+    try:
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(sidecar), suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            file.write(content)
+        os.replace(tmppath, sidecar)  # atomic, so concurrent readers see complete files
+    except OSError as e:
+        log.debug("Could not write config cache file '%s': %s" % (sidecar, str(e)))
+        if tmppath is not None and os.path.exists(tmppath):
+            os.remove(tmppath)
     return conf
 
 
@@ -266,29 +415,31 @@ def merge_dicts_recursively(
     -------
     dict
     """
-    if path is None:
-        path = []
-    for key in dict_b:
-        if key in dict_a:
+    # iterate over nested dictionaries with an explicit stack instead of recursion
+    stack = [(dict_a, dict_b, tuple(path) if path is not None else ())]
+    while stack:
+        a, b, p = stack.pop()
+        if a.keys().isdisjoint(b.keys()):
+            # nothing to merge, take all entries
+            a.update(b)
+            continue
+        for key, vb in b.items():
+            va = a.get(key, _MISSING)
+            if va is _MISSING:
+                a[key] = vb
+                continue
             if mergefunc_keys is not None:
-                dict_a[key] = mergefunc_keys(dict_a[key], dict_b[key])
-            elif isinstance(dict_a[key], dict) and isinstance(dict_b[key], dict):
-                merge_dicts_recursively(
-                    dict_a[key],
-                    dict_b[key],
-                    path + [str(key)],
-                    mergefunc_keys=mergefunc_keys,
-                    mergefunc_values=mergefunc_values,
-                )
-            elif dict_a[key] == dict_b[key]:
+                a[key] = mergefunc_keys(va, vb)
+            elif isinstance(va, dict) and isinstance(vb, dict):
+                stack.append((va, vb, p + (key,)))
+            elif va == vb:
                 pass  # same leaf value
+            elif mergefunc_values is not None:
+                a[key] = mergefunc_values(va, vb)
             else:
-                if mergefunc_values is not None:
-                    dict_a[key] = mergefunc_values(dict_a[key], dict_b[key])
-                else:
-                    raise Exception("Conflict at %s" % ".".join(path + [str(key)]))
-        else:
-            dict_a[key] = dict_b[key]
+                raise Exception(
+                    "Conflict at %s" % ".".join([str(k) for k in p + (key,)])
+                )
     return dict_a
 
 
@@ -306,13 +457,10 @@ def get_config_fromfiles(paths: List[str], subconf_keys: Optional[List[str]] = N
     -------
     None
     """
-    confs = []
-    for path in paths:
-        confs.append(get_config_fromfile(path))
-    conf = {}
-    for confdict in confs:
-        conf = merge_dicts_recursively(conf, confdict)
+    if len(paths) == 0:
+        return {}
+    # get_config_fromfile() returns a copy, so we can merge into the first config in place
+    conf = get_config_fromfile(paths[0])
+    for path in paths[1:]:
+        merge_dicts_recursively(conf, get_config_fromfile(path))
     return conf
-
-
-_config = get_config()
@@ -48,8 +48,7 @@ class GizmoSimulation(GadgetStyleSimulation):
             Whether the path is a candidate for this simulation class.
 
         """
-        if not os.path.isdir(path):
-            return CandidateStatus.NO
-        if "gizmo_parameters.txt" in os.listdir(path):
+        # a single stat call instead of listing (potentially large) directories
+        if os.path.isfile(os.path.join(path, "gizmo_parameters.txt")):
             return CandidateStatus.YES
         return CandidateStatus.NO
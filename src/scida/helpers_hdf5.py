@@ -14,6 +14,30 @@ from scida.config import get_config
 
 log = logging.getLogger(__name__)
 
+# raw data chunk cache for datasets opened for analysis (HDF5 default: 1 MiB).
+# note that this cache is allocated per open dataset.
+RDCC_NBYTES = 32 * 1024**2
+# number of hash table slots of the chunk cache. HDF5 recommends a prime number
+# well above the number of chunks fitting the cache: the cache holds 4096 chunks
+# of 8 KiB (the smallest chunk size h5py chooses automatically), we use the first
+# prime above 10x that number.
+RDCC_NSLOTS = 40961
+RDCC_W0 = 0.75
+
+
+def get_hdf5_readkwargs() -> dict:
+    """
+    Get keyword arguments for opening HDF5 files read-only for analysis via h5py.File.
+    File locking is left at the default, as HDF5 refuses to open a file that is
+    already open with a different locking setting.
+
+    Returns
+    -------
+    dict
+        keyword arguments for h5py.File
+    """
+    return dict(rdcc_nbytes=RDCC_NBYTES, rdcc_nslots=RDCC_NSLOTS, rdcc_w0=RDCC_W0)
+
 
 def get_dtype(obj):
     """
@@ -128,10 +152,83 @@ def walk_hdf5file(fn, tree, get_attrs=True):
         filled dictionary
     """
     with h5py.File(fn, "r") as hf:
-        walk_group(hf, tree, get_attrs=get_attrs)
+        walk_hdf5group(hf, tree, get_attrs=get_attrs)
     return tree
 
 
+def walk_hdf5group(grp, tree, get_attrs=False, scalar_to_attr=True):
+    """
+    Walks through a h5py.Group and fills the tree dictionary with information about
+    the datasets and groups. Same as walk_group, but uses HDF5's native link
+    visitor rather than recursing in python. The native visitor does not follow
+    soft and external links and enters each group only once, so for such links and
+    for additional hard links to a visited group, we walk the target via walk_group.
+
+    Parameters
+    ----------
+    grp: h5py.Group
+        group to walk through
+    tree: dict
+        dictionary to fill
+    get_attrs: bool
+        whether to get attributes of each object
+    scalar_to_attr: bool
+        whether to convert scalar datasets to attributes
+
+    Returns
+    -------
+
+    """
+    if len(tree) == 0:
+        tree.update(**dict(attrs={}, groups=[], datasets=[]))
+    # the visitor below does not include the starting group itself
+    if get_attrs and len(grp.attrs) > 0:
+        tree["attrs"][grp.name] = dict(grp.attrs)
+    tree["groups"].append(grp.name)
+    gid = grp.id
+    basepath = grp.name.rstrip("/") + "/"
+    groups_entered = {gid}
+
+    def visitor(name, info):
+        """visit each link below the given group"""
+        if info.type != h5py.h5l.TYPE_HARD:
+            # soft and external links are not followed by the visitor
+            walk_group(
+                grp[name.decode("utf-8")],
+                tree,
+                get_attrs=get_attrs,
+                scalar_to_attr=scalar_to_attr,
+            )
+            return
+        path = basepath + name.decode("utf-8")
+        oid = h5py.h5o.open(gid, name)
+        if isinstance(oid, h5py.h5g.GroupID):
+            obj = h5py.Group(oid)
+            if oid in groups_entered:
+                # the visitor does not enter a group twice
+                walk_group(
+                    obj, tree, get_attrs=get_attrs, scalar_to_attr=scalar_to_attr
+                )
+                return
+            groups_entered.add(oid)
+            tree["groups"].append(path)
+            if get_attrs and len(obj.attrs) > 0:
+                tree["attrs"][path] = dict(obj.attrs)
+        elif isinstance(oid, h5py.h5d.DatasetID):
+            obj = h5py.Dataset(oid)
+            if get_attrs and len(obj.attrs) > 0:
+                tree["attrs"][path] = dict(obj.attrs)
+            shape = obj.shape
+            tree["datasets"].append([path, shape, get_dtype(obj)])
+            if scalar_to_attr and len(shape) == 0:
+                tree["attrs"][path] = obj[()]
+
+    # creation order where tracked, name order otherwise, matching walk_group
+    gid.links.visit(
+        visitor, info=True, idx_type=h5py.h5.INDEX_CRT_ORDER, order=h5py.h5.ITER_INC
+    )
+
+
 def create_mergedhdf5file(
     fn, files, max_workers=None, virtual=True, groupwise_shape=False
 ):
@@ -3,12 +3,12 @@ Basic IO functionality for scida.
 """
 
 import abc
+import hashlib
 import logging
 import os
 import pathlib
 import tempfile
 from functools import partial
-from os.path import join
 from typing import Optional, Union
 
 import dask.array as da
@@ -18,7 +18,12 @@ import zarr
 
 from scida.config import get_config
 from scida.fields import FieldContainer, walk_container
-from scida.helpers_hdf5 import create_mergedhdf5file, walk_hdf5file, walk_zarrfile
+from scida.helpers_hdf5 import (
+    create_mergedhdf5file,
+    get_hdf5_readkwargs,
+    walk_hdf5file,
+    walk_zarrfile,
+)
 from scida.io.fits import fitsrecords_to_daskarrays
 from scida.misc import get_container_from_path, return_hdf5cachepath
 
@@ -218,9 +223,9 @@ class HDF5Loader(Loader):
         self.location = self.path
         tree = {}
         walk_hdf5file(self.location, tree=tree)
-        file = h5py.File(self.location, "r")
+        file = h5py.File(self.location, "r", **get_hdf5_readkwargs())
         data, metadata = load_datadict_old(
-            self.path, file, token=token, chunksize=chunksize, **kwargs
+            self.path, file, token=token, chunksize=chunksize, tree=tree, **kwargs
         )
         self.file = file
         return data, metadata
@@ -319,6 +324,7 @@ class ZarrLoader(Loader):
             token=token,
             chunksize=chunksize,
             filetype="zarr",
+            tree=tree,
             **kwargs
         )
         return data, metadata
@@ -378,13 +384,21 @@ class ChunkedHDF5Loader(Loader):
             Dictionary of attributes.
         """
         cachefp = return_hdf5cachepath(self.path, fileprefix=fileprefix)
+        paths = self.get_chunkedfiles(
+            fileprefix, choose_prefix=kwargs.get("choose_prefix", False)
+        )
+        path = None
         if cachefp is not None and os.path.isfile(cachefp) and use_cachefile:
-            path = cachefp
-        else:
+            # only use the cache file if it has been created from the current chunks
+            signature = _get_chunkedfiles_signature(paths)
+            try:
+                with h5py.File(cachefp, "r") as hf:
+                    if _cachefile_signature_matches(hf, signature):
+                        path = cachefp
+            except OSError:
+                pass  # file potentially corrupted, fall back to chunks
+        if path is None:
             # get data from first file in list
-            paths = self.get_chunkedfiles(
-                fileprefix, choose_prefix=kwargs.get("choose_prefix", False)
-            )
             if len(paths) == 0:
                 raise ValueError("No files for prefix '%s' found." % fileprefix)
             path = paths[0]
@@ -441,6 +455,7 @@ class ChunkedHDF5Loader(Loader):
             # 3. cachefile exists, but overwrite=True
             create = True
 
+        signature = None
         if create:
             print_cachefile_creation = kwargs.get("print_cachefile_creation", True)
             self.create_cachefile(
@@ -449,18 +464,34 @@ class ChunkedHDF5Loader(Loader):
                 verbose=print_cachefile_creation,
                 choose_prefix=choose_prefix,
             )
+        else:
+            # check whether the chunks changed since the cache file has been created
+            files = self.get_chunkedfiles(fileprefix, choose_prefix=choose_prefix)
+            if len(files) == 0:
+                # never replace an existing cache file by an empty one
+                raise ValueError("No files for prefix '%s' found." % fileprefix)
+            signature = _get_chunkedfiles_signature(files)
 
+        location = cachefp if cachefp is not None else self.location
         try:
             data, metadata = self.load_cachefile(
-                cachefp, token=token, chunksize=chunksize, **kwargs
+                location,
+                token=token,
+                chunksize=chunksize,
+                signature=signature,
+                **kwargs
             )
         except InvalidCacheError:
             # if we get an error, we try to create a new cache file (once)
             log.info("Invalid cache file, attempting to create new one.")
-            os.remove(cachefp)
-            self.create_cachefile(fileprefix=fileprefix, virtualcache=virtualcache)
+            os.remove(location)
+            self.create_cachefile(
+                fileprefix=fileprefix,
+                virtualcache=virtualcache,
+                choose_prefix=choose_prefix,
+            )
             data, metadata = self.load_cachefile(
-                cachefp, token=token, chunksize=chunksize, **kwargs
+                self.location, token=token, chunksize=chunksize, **kwargs
             )
         return data, metadata
 
@@ -511,6 +542,8 @@ class ChunkedHDF5Loader(Loader):
             print("Creating cache file, this may take a while...")
         cachefp = return_hdf5cachepath(self.path, fileprefix=fileprefix)
         files = self.get_chunkedfiles(fileprefix, choose_prefix=choose_prefix)
+        if len(files) == 0:
+            raise ValueError("No files for prefix '%s' found." % fileprefix)
 
         self.location = cachefp
         if cachefp is None:
@@ -522,16 +555,19 @@ class ChunkedHDF5Loader(Loader):
             )
 
         try:
-            create_mergedhdf5file(cachefp, files, virtual=virtualcache)
+            create_mergedhdf5file(self.location, files, virtual=virtualcache)
         except Exception as ex:
-            if os.path.exists(cachefp):
-                os.remove(cachefp)  # remove failed attempt at merging file
+            if os.path.exists(self.location):
+                os.remove(self.location)  # remove failed attempt at merging file
             raise ex
 
-        with h5py.File(cachefp, "r+") as hf:
+        with h5py.File(self.location, "r+") as hf:
+            hf.attrs["_chunksignature"] = _get_chunkedfiles_signature(files)
             hf.attrs["_cachingcomplete"] = True  # mark that caching complete
 
-    def load_cachefile(self, location, token="", chunksize="auto", **kwargs):
+    def load_cachefile(
+        self, location, token="", chunksize="auto", signature=None, **kwargs
+    ):
         """
         Load data from cache file.
 
@@ -543,6 +579,9 @@ class ChunkedHDF5Loader(Loader):
             Token to be used for dask arrays.
         chunksize: str
             Chunksize for dask arrays.
+        signature: Optional[str]
+            Signature of the chunk files the cache file is expected to be created from.
+            If None, the signature is not checked.
         kwargs: dict
             Additional keyword arguments.
 
@@ -552,7 +591,7 @@ class ChunkedHDF5Loader(Loader):
             Tuple of data and metadata.
         """
         try:
-            self.file = h5py.File(location, "r")
+            self.file = h5py.File(location, "r", **get_hdf5_readkwargs())
         except (
             OSError
         ) as e:  # file potentially corrupted, raise InvalidCacheError and potentially recover
@@ -566,9 +605,15 @@ class ChunkedHDF5Loader(Loader):
         if "_cachingcomplete" in hf.attrs:
             cache_valid = hf.attrs["_cachingcomplete"]
         if not cache_valid:
+            hf.close()
             raise InvalidCacheError(
                 "Cache file '%s' is not valid. Delete file and try again." % location
             )
+        if signature is not None and not _cachefile_signature_matches(hf, signature):
+            hf.close()
+            raise InvalidCacheError(
+                "Cache file '%s' is outdated, the chunk files have changed." % location
+            )
 
         datadict = load_datadict_old(
             location, self.file, token=token, chunksize=chunksize, **kwargs
@@ -586,6 +631,7 @@ def load_datadict_old(
     lazy=True,  # if true, call da.from_array delayed
     filetype="hdf5",
     withunits=False,
+    tree=None,
 ):
     """
     Load data from HDF5/Zarr resource into a dictionary of dask arrays.
@@ -609,6 +655,9 @@ def load_datadict_old(
         Filetype of resource.
     withunits: bool
         Whether to load units.
+    tree: Optional[dict]
+        Tree of the resource as returned by walk_hdf5file/walk_zarrfile.
+        If None, the resource is walked here.
 
     Returns
     -------
@@ -622,68 +671,76 @@ def load_datadict_old(
         inline_array = False
 
     data = {}
-    tree = {}
-    if filetype == "hdf5":
-        walk_hdf5file(location, tree)
-    elif filetype == "zarr":
-        walk_zarrfile(location, tree)
-    else:
-        raise ValueError("Unknown filetype ''" % filetype)
+    if tree is None:
+        tree = {}
+        if filetype == "hdf5":
+            walk_hdf5file(location, tree)
+        elif filetype == "zarr":
+            walk_zarrfile(location, tree)
+        else:
+            raise ValueError("Unknown filetype '%s'" % filetype)
 
     # hosting all data
     rootcontainer = FieldContainer(
         fieldrecipes_kwargs=derivedfields_kwargs, withunits=withunits
     )
 
-    datagroups = []  # names of groups with datasets
     # othergroups = []  # names of groups without datasets
     # datasets = []  # list of datasets (relative path from root)
     # each dataset entry is a tuple of (relpath, shape, dtype)
     # attributes = {}  # dictionary of attributes
     # key holds the relpath to the group and the value a dictionary of the attribute data
 
-    grps = tree["groups"]
-    dts = tree["datasets"]
-    for grp in grps:
-        for dt in dts:
-            dn = dt[0]
-            if dn.startswith(grp):
-                datagroups.append(grp)
-                break
+    # collect all groups that contain datasets (directly or in subgroups)
+    grps_with_datasets = set()
+    for dt in tree["datasets"]:
+        grp = dt[0]
+        while grp != "":
+            grp = grp.rpartition("/")[0]
+            if grp in grps_with_datasets:
+                break  # all parents have been added already
+            grps_with_datasets.add(grp)
+    if "" in grps_with_datasets:
+        grps_with_datasets.add("/")  # root group
+    datagroups = [grp for grp in tree["groups"] if grp in grps_with_datasets]
 
     # groups
     if groups_load is not None:
+        groups_load = set(groups_load)
         datagroups = sorted([grp for grp in datagroups if grp in groups_load])
+    datagroups_set = set(datagroups)
 
     # Make each datadict entry a FieldContainer
     for group in datagroups:
         get_container_from_path(group, rootcontainer, create_missing=True)
 
+    # dask names stored in the file (if any), read all at once
+    dasknames = {}
+    if "__dask_tokenize__" in file:
+        dasknames = dict(file["__dask_tokenize__"].attrs)
+
     # datasets
+    nameprefix = "Dataset" + str(token)
     for i, dataset in enumerate(tree["datasets"]):
-        # fpath is the path to the group containing given field
         # ignore if scalar
         if len(dataset[1]) == 0:
             continue
-        fpath = "/".join(dataset[0].split("/")[:-1])
-        toload = fpath == "" or fpath in datagroups
+        fieldpath = dataset[0]
+        # fpath is the path to the group containing given field
+        fpath, _, fieldname = fieldpath.rpartition("/")
+        toload = fpath == "" or fpath in datagroups_set
         if not toload:
             continue
 
         container = get_container_from_path(fpath, rootcontainer)
         # TODO: still change for nesting
-        splt = dataset[0].rstrip("/").split("/")
-        group = splt[1]
-        fieldname = splt[-1]
-        name = "Dataset" + str(token) + dataset[0].replace("/", "_")
-        if "__dask_tokenize__" in file:  # check if the file contains the dask name.
-            name = file["__dask_tokenize__"].attrs.get(dataset[0].strip("/"), name)
+        name = nameprefix + fieldpath.replace("/", "_")
+        name = dasknames.get(fieldpath.strip("/"), name)
 
         # we do not support HDF5 vlen dtype
+        # (use dtype from tree, so we do not need to open the dataset here)
         if filetype == "hdf5":
-            hds = file[dataset[0]]
-            dt = hds.dtype
-            if h5py.check_vlen_dtype(dt):
+            if h5py.check_vlen_dtype(np.dtype(dataset[2])):
                 log.warning(
                     "HDF5 vlen dtypes not supported. Skip loading field '%s'"
                     % fieldname
@@ -691,7 +748,6 @@ def load_datadict_old(
                 continue
 
         lz = lazy and i > 0  # need one non-lazy field (?)
-        fieldpath = dataset[0]
         _add_hdf5arr_to_fieldcontainer(
             file,
             container,
@@ -706,6 +762,9 @@ def load_datadict_old(
     data = rootcontainer
 
     dtsdict = {k[0]: k[1:] for k in tree["datasets"]}
+    uidchunks = "auto" if chunksize is None else chunksize
+    if isinstance(uidchunks, (tuple, list)):
+        uidchunks = uidchunks[0]
 
     # create uids fields for all containers
     def create_uids(container: FieldContainer, path: str):
@@ -715,14 +774,18 @@ def load_datadict_old(
         nparts = -1
         keys = container.keys(withgroups=False, withrecipes=True)
         for k in keys:
-            dpath = path + "/" + k
-            shape = dtsdict[dpath][0]
-            nparts = shape[0]
+            entry = dtsdict.get(path + "/" + k)
+            if entry is not None:
+                # all fields of a container share their length, so the first one is enough
+                nparts = entry[0][0]
+                break
         if nparts > -1:
+            # da.arange creates each block on demand, so nothing is allocated up front.
             # TODO: as we do not load any fields any more we do not have a reference for the dask chunking.
-            container["uid"] = da.arange(nparts)
+            # (for explicit chunk sizes, we can at least align with the fields' first axis)
+            container["uid"] = da.arange(nparts, chunks=uidchunks, dtype=np.int64)
         else:
-            print("no uid created for %s" % container.name)
+            log.debug("no uid created for %s" % container.name)
 
     walk_container(data, handler_group=create_uids)
 
@@ -964,32 +1027,31 @@ def _get_chunkedfiles(
 
     """
 
-    fns = [f for f in os.listdir(path)]
-    files = [join(path, f) for f in fns]
-    files = [
-        f
-        for i, f in enumerate(files)
-        if not any(fns[i].startswith(start) for start in [".", "bak"])
-    ]  # ignore hidden files
-    files = [f for f in files if os.path.isfile(f)]  # ignore subdirectories
-    if fileprefix is not None:
-        files = [f for f in files if f.split("/")[-1].startswith(fileprefix)]
-    # ignore backup files
-    files = [f for f in files if not f.endswith("~")]
-    files = [f for f in files if not f.endswith(".bak")]
-    files = [f for f in files if not f.endswith(".swp")]
-
-    files = np.array(files)
-    prfxs = sorted([f.split(".")[0] for f in files])
-    if fileprefix is None:
+    # single pass over directory; DirEntry caches file type information from the listing
+    entries = []  # tuples of (prefix, path, name)
+    with os.scandir(path) as it:
+        for e in it:
+            fn = e.name
+            if fn.startswith((".", "bak")):
+                continue  # ignore hidden files
+            if fn.endswith(("~", ".bak", ".swp")):
+                continue  # ignore backup files
+            if fileprefix is not None and not fn.startswith(fileprefix):
+                continue
+            if not e.is_file():
+                continue  # ignore subdirectories
+            entries.append((fn.split(".")[0], e.path, fn))
+
+    prfxs = sorted([entry[0] for entry in entries])
+    if fileprefix is None and len(prfxs) > 0:
         prfx = prfxs[0]
         prfxs = [prfx]
-        files = np.array([f for f in files if f.startswith(prfx)])
+        entries = [entry for entry in entries if entry[2].startswith(prfx)]
     if len(set(prfxs)) > 1:
         if choose_prefix:
             # choose prefix that occurs more often
             prfx = max(set(prfxs), key=prfxs.count)
-            files = np.array([f for f in files if f.startswith(prfx)])
+            entries = [entry for entry in entries if entry[2].startswith(prfx)]
         else:
             # print("Available prefixes:", set(prfxs))
             msg = (
@@ -998,15 +1060,55 @@ def _get_chunkedfiles(
             )
             raise ValueError(msg)
     # determine numbers where possible
-    numbers = []
     files_numbered = []
-    for f in files:
+    for _, fp, fn in entries:
         try:
-            numbers.append(int(f.split(".")[-2]))
-            files_numbered.append(f)
-        except ValueError:
+            files_numbered.append((int(fn.rsplit(".", 2)[-2]), fp))
+        except (ValueError, IndexError):
             pass  # do not add file
-    sortidx = np.argsort(numbers)
-    files_numbered = np.array(files_numbered)
-    files = files_numbered[sortidx]
+    files_numbered.sort()
+    files = [fp for _, fp in files_numbered]
     return files
+
+
+def _cachefile_signature_matches(hf, signature) -> bool:
+    """
+    Check whether a cache file has been created from chunk files with given signature.
+
+    Parameters
+    ----------
+    hf: h5py.File
+        Open cache file.
+    signature: str
+        Signature of the current chunk files, see _get_chunkedfiles_signature.
+
+    Returns
+    -------
+    bool
+    """
+    # cache files from older versions do not carry a signature. we cannot tell
+    # whether these are up-to-date, so they are rebuilt once.
+    return hf.attrs.get("_chunksignature") == signature
+
+
+def _get_chunkedfiles_signature(files) -> str:
+    """
+    Get a signature of the given chunk files, changing whenever files are added,
+    removed or modified.
+
+    Parameters
+    ----------
+    files: list
+        Paths to the chunk files.
+
+    Returns
+    -------
+    str
+    """
+    sig = hashlib.blake2b(digest_size=8)
+    for fp in files:
+        st = os.stat(fp)
+        sig.update(
+            ("%s:%i:%i;" % (os.path.basename(fp), st.st_mtime_ns, st.st_size)).encode()
+        )
+    return sig.hexdigest()
@@ -1,4 +1,16 @@
-from scida.config import get_config, get_config_fromfiles, get_simulationconfig
+import json
+
+import pytest
+import yaml
+
+import scida.config
+from scida.config import (
+    get_config,
+    get_config_fromfile,
+    get_config_fromfiles,
+    get_simulationconfig,
+    merge_dicts_recursively,
+)
 
 
 def test_load_defaultconf():
@@ -28,3 +40,57 @@ def test_usersimconf(mocker):
     assert "TNG50" in data
     assert "test" in data["TNG50"]
     assert len(data["TNG50"]) == 1  # only the key we just added should be there
+
+
+def test_config_fromfile_cache(tmp_path):
+    fp = tmp_path / "test.yaml"
+    fp.write_text("a: 1\n")
+    conf = get_config_fromfile(str(fp))
+    assert conf == {"a": 1}
+    # returned configs can be modified without affecting the cache
+    conf["a"] = 2
+    assert get_config_fromfile(str(fp)) == {"a": 1}
+    # file changes are picked up
+    fp.write_text("a: 1\nb: 2\n")
+    assert get_config_fromfile(str(fp)) == {"a": 1, "b": 2}
+
+
+def test_merge_dicts_recursively():
+    a = {"x": {"y": {"z": 1}, "w": 2}, "v": 3}
+    b = {"x": {"y": {"u": 4}, "w": 2}, "t": 5}
+    merged = merge_dicts_recursively(a, b)
+    assert merged is a
+    assert merged == {"x": {"y": {"z": 1, "u": 4}, "w": 2}, "v": 3, "t": 5}
+    with pytest.raises(Exception) as exc_info:
+        merge_dicts_recursively(a, {"x": {"y": {"z": 2}}})
+    assert "Conflict at x.y.z" in str(exc_info.value)
+
+
+def test_config_fromfile_sidecar(tmp_path, cachedir, mocker):
+    fp = tmp_path / "test.yaml"
+    fp.write_text("a: [1, 2]\nb: {c: text}\n")
+    conf = get_config_fromfile(str(fp))
+    sidecars = list((cachedir / "configs").glob("*.json"))
+    assert len(sidecars) == 1
+    # sidecar is used once the in-memory cache is cleared, without parsing the YAML
+    scida.config._configfile_cache.clear()
+    yamlload = mocker.patch("scida.config.yaml.load", wraps=yaml.load)
+    assert get_config_fromfile(str(fp)) == conf
+    yamlload.assert_not_called()
+
+    # sidecars no longer matching the YAML file's mtime or size are ignored
+    for key in ["mtime_ns", "size"]:
+        cached = json.loads(sidecars[0].read_text())
+        cached[key] += 1
+        cached["config"] = {"a": "outdated"}
+        sidecars[0].write_text(json.dumps(cached))
+        scida.config._configfile_cache.clear()
+        yamlload.reset_mock()
+        assert get_config_fromfile(str(fp)) == conf
+        yamlload.assert_called_once()
+
+    # configs that do not survive a round trip through JSON are not cached
+    fp = tmp_path / "test_intkeys.yaml"
+    fp.write_text("1: a\n")
+    assert get_config_fromfile(str(fp)) == {1: "a"}
+    assert len(list((cachedir / "configs").glob("*.json"))) == 1
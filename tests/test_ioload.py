@@ -1,8 +1,17 @@
 import pathlib
 
-from scida.io import load
+import h5py
+import numpy as np
+import pytest
 
-from .helpers import write_gadget_testfile, write_hdf5flat_testfile
+from scida.helpers_hdf5 import walk_group, walk_hdf5file
+from scida.io import load, load_metadata
+
+from .helpers import (
+    DummyGadgetSnapshotFile,
+    write_gadget_testfile,
+    write_hdf5flat_testfile,
+)
 
 
 def test_ioload_hdf5flat(tmp_path):
@@ -27,3 +36,181 @@ def test_ioload_gadget(tmp_path):
 
     assert "BoxSize" in metadata["/Header"]
     assert "PartType0" in fcc
+
+
+def test_ioload_chunked(tmp_path):
+    # a chunked dataset is a folder of hdf5 files with the naming "PREFIX.NMBR.hdf5"
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    nchunks = 3
+    for i in range(nchunks):
+        write_gadget_testfile(p / ("snap.%i.hdf5" % i))
+    # files and folders to be ignored
+    (p / "snap.3.hdf5~").touch()
+    (p / ".snap.4.hdf5").touch()
+    (p / "subfolder").mkdir()
+
+    res = load(p)
+    fcc, metadata, hf, tmpfile = res
+
+    assert "PartType0" in fcc
+    assert fcc["PartType0"]["Density"].shape[0] == nchunks
+    hf.close()
+
+    # metadata does not come from an outdated cache file
+    for i in range(nchunks):
+        with h5py.File(p / ("snap.%i.hdf5" % i), "r+") as f:
+            f["Header"].attrs["NewAttr"] = 42
+    assert load_metadata(p)["/Header"]["NewAttr"] == 42
+
+    # cache file is recreated once the chunks change
+    write_gadget_testfile(p / ("snap.%i.hdf5" % nchunks))
+    fcc, metadata, hf, tmpfile = load(p)
+    assert fcc["PartType0"]["Density"].shape[0] == nchunks + 1
+    hf.close()
+
+
+def test_ioload_chunked_missingchunks(tmp_path):
+    # an existing cache file is kept if the chunks cannot be found
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    for i in range(2):
+        write_gadget_testfile(p / ("snap.%i.hdf5" % i))
+    fcc, metadata, hf, tmpfile = load(p, virtualcache=False)
+    cachefp = hf.filename
+    hf.close()
+
+    for i in range(2):
+        (p / ("snap.%i.hdf5" % i)).unlink()
+    with pytest.raises(ValueError):
+        load(p, virtualcache=False)
+    with h5py.File(cachefp, "r") as f:
+        assert f["PartType0"]["Density"].shape[0] == 2
+
+
+def test_ioload_chunked_unsigned(tmp_path):
+    # cache files without chunk signature (from older versions) are rebuilt once
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    for i in range(2):
+        write_gadget_testfile(p / ("snap.%i.hdf5" % i))
+    fcc, metadata, hf, tmpfile = load(p)
+    cachefp = hf.filename
+    hf.close()
+
+    write_gadget_testfile(p / "snap.2.hdf5")
+    with h5py.File(cachefp, "r+") as f:
+        del f.attrs["_chunksignature"]
+    fcc, metadata, hf, tmpfile = load(p)
+    assert fcc["PartType0"]["Density"].shape[0] == 3
+    assert "_chunksignature" in hf.attrs
+    hf.close()
+
+
+def test_ioload_chunked_nocachedir(tmp_path, mocker):
+    # without caching directory, the merged file is written to a temporary file
+    mocker.patch("scida.io._base.return_hdf5cachepath", return_value=None)
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    for i in range(2):
+        write_gadget_testfile(p / ("snap.%i.hdf5" % i))
+
+    fcc, metadata, hf, tmpfile = load(p)
+    assert tmpfile is not None
+    assert fcc["PartType0"]["Density"].shape[0] == 2
+    hf.close()
+
+
+def test_ioload_chunked_copied(tmp_path):
+    # instead of linking to the chunks, the cache file can hold a copy of the data
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    rng = np.random.default_rng(42)
+    # number of particles per type in each chunk, including chunks without gas
+    lengths = [[2, 1, 0, 1, 1, 1], [0, 3, 0, 1, 1, 1], [4, 2, 0, 1, 1, 1]]
+    for i, lngths in enumerate(lengths):
+        dummy = DummyGadgetSnapshotFile()
+        dummy.create_dummyheader(lengths=lngths)
+        dummy.create_dummyfieldcontainer(lengths=lngths)
+        for fields in dummy.particles.values():
+            for k, v in fields.items():
+                fields[k] = rng.random(v.shape)
+        dummy.write(p / ("snap.%i.hdf5" % i))
+
+    fcc, metadata, hf, tmpfile = load(p, virtualcache=False)
+    assert not hf["PartType0"]["Density"].is_virtual
+    for field in ["Density", "Coordinates"]:
+        expected = []
+        for i in range(len(lengths)):
+            with h5py.File(p / ("snap.%i.hdf5" % i), "r") as f:
+                expected.append(f["PartType0"][field][()])
+        expected = np.concatenate(expected)
+        assert np.array_equal(hf["PartType0"][field][()], expected)
+        assert np.array_equal(fcc["PartType0"][field].compute(), expected)
+    hf.close()
+
+
+def test_ioload_h5py_access(tmp_path):
+    # files loaded (and kept open) by scida can still be opened by plain h5py, and vice versa
+    p = pathlib.Path(tmp_path) / "snapdir"
+    p.mkdir()
+    for i in range(2):
+        write_gadget_testfile(p / ("snap.%i.hdf5" % i))
+    with h5py.File(p / "snap.0.hdf5", "r"):
+        fcc, metadata, hf, tmpfile = load(p)
+    fcc["PartType0"]["Density"].compute()  # reads through the virtual datasets
+    with h5py.File(p / "snap.1.hdf5", "r"):
+        pass
+    with h5py.File(hf.filename, "r"):
+        pass
+    hf.close()
+
+
+def test_ioload_softlink(tmp_path):
+    # groups and datasets reachable via soft links (e.g. aliases in SWIFT snapshots) are loaded
+    p = pathlib.Path(tmp_path) / "test.hdf5"
+    write_gadget_testfile(p)
+    with h5py.File(p, "r+") as f:
+        f["GasParticles"] = h5py.SoftLink("/PartType0")
+        f["PartType1/DensityAlias"] = f["PartType0/Density"]
+
+    fcc, metadata, hf, tmpfile = load(p)
+    assert "Density" in fcc["GasParticles"]
+    assert "DensityAlias" in fcc["PartType1"]
+    hf.close()
+
+
+def test_ioload_walk_order(tmp_path):
+    # the native walk matches walk_group, including creation order and aliased groups
+    p = pathlib.Path(tmp_path) / "test.hdf5"
+    with h5py.File(p, "w", track_order=True) as f:
+        grp = f.create_group("PartType0", track_order=True)
+        grp["Masses"] = np.ones(3)
+        grp["Coordinates"] = np.ones((3, 3))
+
+    for links in [False, True]:
+        if links:
+            with h5py.File(p, "r+") as f:
+                f["PartType1"] = f["PartType0"]
+                f["GasParticles"] = h5py.SoftLink("/PartType0")
+        with h5py.File(p, "r") as f:
+            tree_ref = {}
+            walk_group(f, tree_ref, get_attrs=True)
+        tree = walk_hdf5file(p, {})
+        assert tree["groups"] == tree_ref["groups"]
+        datasets = [d[0] for d in tree["datasets"]]
+        assert datasets == [d[0] for d in tree_ref["datasets"]]
+        assert datasets[0] == "/PartType0/Masses"
+
+
+def test_ioload_prefixgroups(tmp_path):
+    # groups are only loaded if they contain datasets, not if their name is a prefix of such
+    p = pathlib.Path(tmp_path) / "test.hdf5"
+    with h5py.File(p, "w") as f:
+        f.create_group("PartType1")
+        f["PartType10/Masses"] = np.ones(3)
+
+    fcc, metadata, hf, tmpfile = load(p)
+    assert "PartType10" in fcc
+    assert "PartType1" not in fcc
+    hf.close()
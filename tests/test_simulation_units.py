@@ -16,14 +16,17 @@ def test_simulation_tng50(testdatapath):
     # Compare dark matter mass
     cosmology: FlatLambdaCDM = snp.cosmology
     ureg = snp.unitregistry
+    # units are bound to the snapshot's registry, so we build them once here
+    msun = ureg.Msun
+    msun_per_h = msun / ureg.h
     vol = np.product(snp.boxsize) / cosmology.h**3 * ureg.kpc**3
     dens = (cosmology.Om0 - cosmology.Ob0) * cosmology.critical_density0
     dens = dens.value * ureg(dens.unit.to_string("ogip"))
     boxmass = vol * dens
     nparts = snp.header["NumPart_Total"][1]
     massperparticle = snp.header["MassTable"][1]
-    partmass = nparts * massperparticle * 1e10 * ureg("Msun") / ureg("h")
-    assert np.isclose(boxmass.to("Msun"), partmass.to("Msun"), rtol=1e-4)
+    partmass = nparts * massperparticle * 1e10 * msun_per_h
+    assert np.isclose(boxmass.to(msun), partmass.to(msun), rtol=1e-4)
 
     maxpos = snp.data["PartType0"]["Coordinates"].max()
     # TODO: Failing because "h" is still thought of as hours: